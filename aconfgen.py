@@ -15,12 +15,17 @@
 # along with this program.	If not, see <http://www.gnu.org/licenses/>.
 
 # import section
-import argparse
 import copy
 import os
 import sys
 import re
-import libxml2
+
+# XML backend, imported on first use by loadBackend()
+libxml2 = None
+# directory containing XML schemas
+schemaDir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'schemas')
+# parsed XML schemas cache
+schemaCache = {}
 
 # default namespaces for definition files
 defNS = {'jpdl-3.1': 'urn:jbpm.org:jpdl-3.1',
@@ -29,7 +34,17 @@ defNS = {'jpdl-3.1': 'urn:jbpm.org:jpdl-3.1',
 # exception classes
 class ValidationException(Exception):
 	'''Super class for validation exceptions.'''
-	pass
+
+	def __init__(self, message, diagnostics=None):
+		'''Exception constructor.
+
+		Keyword arguments:
+			message -- error message
+			diagnostics -- dictionary of validation errors lists keyed by schema language (default None)
+
+		'''
+		Exception.__init__(self, message)
+		self.diagnostics = diagnostics or {}
 
 class InvalidSchemaException(ValidationException):
 	'''Exception to raise when schema is invalid.'''
@@ -48,31 +63,187 @@ class InvalidActionException(ValidationException):
 	'''Exception to raise when invalid action was invoked.'''
 	pass
 
+# backend helpers
+def loadBackend():
+	'''Imports libxml2 on first call and returns it. Global libxml2 error handler is left intact,
+	error messages are suppressed locally by parser options and context error handlers.'''
+	global libxml2
+	if libxml2 is None:
+		import libxml2
+	return libxml2
+
+def parseOptions():
+	'''Returns libxml2 parser options suppressing error and warning messages.'''
+	return libxml2.XML_PARSE_NOERROR | libxml2.XML_PARSE_NOWARNING
+
+# validation helpers
+def validateDocument(xml, schemaFile, lang):
+	'''Validates document against XML schema and returns list of validation errors (empty on success).
+
+	Keyword arguments:
+		xml -- document to validate
+		schemaFile -- path to XML schema
+		lang -- language id of schema, used in error messages
+
+	'''
+	loadBackend()
+	try:
+		# load schema, parse it only once
+		if schemaFile not in schemaCache:
+			schema_parser_ctx = libxml2.schemaNewParserCtxt(schemaFile)
+			schemaCache[schemaFile] = schema_parser_ctx.schemaParse()
+		valid_schema = schemaCache[schemaFile].schemaNewValidCtxt()
+	except libxml2.libxmlError, e:
+		raise InvalidSchemaException('Schema for '+lang + ' is invalid.')
+
+	# collect validation errors instead of discarding them
+	errors = []
+	valid_schema.setValidityErrorHandler(lambda msg, arg: errors.append(msg.strip()), lambda msg, arg: None)
+	# validate
+	if xml.schemaValidateDoc(valid_schema) and not errors:
+		errors.append('Document is not valid.')
+	return errors
+
+# share config shard helpers
+# state of shard builder in current process, set up by initUIConfigShard()
+shardState = {}
+
+def initUIConfigShard(confgen, options):
+	'''Prepares current process for building share config shards with buildUIConfigShard().
+
+	Keyword arguments:
+		confgen -- ConfigGenerator containing validated content model
+		options -- dictionary of writeUIConfig() arguments and content model namespace
+
+	'''
+	ctx = confgen.xml.xpathNewContext()
+	ctx.xpathRegisterNs('defaultns', options['ns'])
+	shardState['confgen'] = confgen
+	shardState['options'] = options
+	shardState['ctx'] = ctx
+	shardState['types'] = ctx.xpathEval('/defaultns:model/defaultns:types/defaultns:type')
+
+def initUIConfigShardWorker(confgen, options, data=None, addComments=False):
+	'''Worker process initializer. Prepares shard builder for content model inherited from parent
+	process, or parses serialized content model where workers are not forked.
+
+	Keyword arguments:
+		confgen -- ConfigGenerator of parent process (None if content model is given in data)
+		options -- dictionary of writeUIConfig() arguments and content model namespace
+		data -- serialized content model (default None)
+		addComments -- add comments to result XML, used with data (default False)
+
+	'''
+	try:
+		if confgen is None:
+			confgen = ConfigGenerator(addComments=addComments, data=data)
+		initUIConfigShard(confgen, options)
+	except Exception, e:
+		# failing initializer makes pool restart workers forever, report error from buildUIConfigShard() instead
+		shardState['error'] = e
+
+def buildUIConfigShard(index):
+	'''Builds share config for type with given index. Writes it to separate file and returns
+	file name if output directory is set, otherwise returns serialized config elements.
+
+	Keyword arguments:
+		index -- index of type in content model
+
+	'''
+	if 'error' in shardState:
+		raise shardState['error']
+	confgen = shardState['confgen']
+	options = shardState['options']
+	typeNode = shardState['types'][index]
+	# build config document containing only this type
+	result = confgen.createUIConfigDoc()
+	confgen.buildTypeConfig(result, shardState['ctx'], typeNode, options['workflowModel'], options['processName'], options['addLabelId'], options['addSets'])
+	if options['removeBlanks']:
+		confgen.removeBlankNodes(result)
+	if options['outputDir']:
+		# write separate config file
+		fileName = os.path.join(options['outputDir'], typeNode.prop('name').replace(':', '_') + '.xml')
+		written = result.saveFormatFileEnc(fileName, 'utf-8', options['format'])
+		result.freeDoc()
+		if written < 0:
+			raise IOError('failed to save ' + fileName)
+		return fileName
+	# extract content of root element
+	text = result.serialize('utf-8', options['format'])
+	result.freeDoc()
+	text = text[text.index('<alfresco-config>') + len('<alfresco-config>'):text.rindex('</alfresco-config>')]
+	if options['format']:
+		text = text.rstrip('\n')
+	return text
+
 # config generator class
 class ConfigGenerator:
-	'''ConfigGenerator class. Generates skeleton of Alfresco configuration files'''
+	'''ConfigGenerator class. Generates skeleton of Alfresco configuration files.
 
-	def noErr(self, ctx, str):
-		'''Dummy function to suppress error messages.'''
-		pass
+	Source XML can be given as file name, string or already parsed document.
+	XML backend is loaded and source is parsed only when an action needs them.
+	'''
 
-	def __init__(self, xmlFile, addComments=False):
-		'''Class constructor. Collects some information needed for config generation, loads XML.
+	def __init__(self, xmlFile=None, addComments=False, xml=None, data=None):
+		'''Class constructor. Collects some information needed for config generation.
 
 		Keyword arguments:
+			xmlFile -- file that contains XML to parse (default None)
 			addComments -- add comments to result XML (default False)
-			xmlFile -- file that contains XML to parse
+			xml -- already parsed document to use instead of reading xmlFile (default None)
+			data -- string containing XML to use instead of reading xmlFile (default None)
 
 		'''
-		# get path to script
-		self.scriptPath = os.path.dirname(os.path.realpath(sys.argv[0]))
+		# get path to module
+		self.scriptPath = os.path.dirname(schemaDir)
+		if xmlFile is None and xml is None and data is None:
+			raise ValueError('One of xmlFile, xml or data must be given.')
 		# default options
 		self.addComments = addComments
 		self.xmlFile = xmlFile
-		# suppress all error messages from libxml2
-		libxml2.registerErrorHandler(self.noErr, None)
-		# load xml
-		self.xml = libxml2.readFile(xmlFile, None, 0)
+		self.xmlData = data
+		self.parsedXml = xml
+		# document given by caller is freed by caller
+		self.ownsXml = xml is None
+		self.xmlResult = False
+		self.result = None
+		# xpath contexts created by actions, freed by free()
+		self.contexts = []
+
+	def load(self):
+		'''Loads XML backend and parses source XML if it isn't parsed yet. Returns parsed document.'''
+		loadBackend()
+		if self.parsedXml is None:
+			if self.xmlData is not None:
+				self.parsedXml = libxml2.readMemory(self.xmlData, len(self.xmlData), None, None, parseOptions())
+			else:
+				self.parsedXml = libxml2.readFile(self.xmlFile, None, parseOptions())
+		return self.parsedXml
+
+	@property
+	def xml(self):
+		'''Source document, parsed on first access.'''
+		return self.load()
+
+	def newXPathContext(self, doc):
+		'''Creates xpath context for document. Context is freed by free().'''
+		ctx = doc.xpathNewContext()
+		self.contexts.append(ctx)
+		return ctx
+
+	def free(self):
+		'''Frees result document and source document parsed by generator. libxml2 wrappers
+		never free documents on their own, so long-running callers should call it when done.'''
+		for ctx in self.contexts:
+			ctx.xpathFreeContext()
+		self.contexts = []
+		# swimlanes result wraps source document itself, don't free it twice
+		if self.xmlResult and self.result is not None and not self.result == self.parsedXml:
+			self.result.freeDoc()
+		if self.ownsXml and self.parsedXml is not None:
+			self.parsedXml.freeDoc()
+		self.parsedXml = None
+		self.result = None
 
 	def removeBlankNodes(self, node):
 		'''Removes all blank nodes from result xml'''
@@ -98,43 +269,34 @@ class ConfigGenerator:
 		Exception is raised in any other case'''
 
 		schemas = {'jpdl-3.1': 'jpdl-3.1.xsd', 'jpdl-3.2': 'jpdl-3.2.xsd', 'bpmn-2.0' : 'BPMN20.xsd'};
-		# iterate through all schemas and try to validate XML
+		# validate XML against cached schemas one by one, first successful validation wins.
+		# Schema for another dialect rejects document at its root element almost at once,
+		# so this costs about as much as the matching schema alone.
 		definitionLang = None;
+		diagnostics = {}
 		for lang in schemas:
-			try:
-				# load schema
-				schema_parser_ctx = libxml2.schemaNewParserCtxt(os.path.join(self.scriptPath, 'schemas', schemas[lang]))
-				schema = schema_parser_ctx.schemaParse()
-				valid_schema = schema.schemaNewValidCtxt()
-			except libxml2.libxmlError, e:
-				raise InvalidSchemaException('Schema for '+lang + ' is invalid.')
-
-			# validate
-			if not self.xml.schemaValidateDoc(valid_schema):
+			errors = validateDocument(self.xml, os.path.join(schemaDir, schemas[lang]), lang)
+			if not errors:
 				# xml validate, store result
-				definitionLang = lang;
+				definitionLang = lang
+				break
+			# collect errors of failed validation
+			diagnostics[lang] = errors
 
 		if not definitionLang:
 			# language not found, raise exception
-			raise InvalidProcDefException("Process definition is invalid.")
+			raise InvalidProcDefException("Process definition is invalid.", diagnostics)
 
 		return definitionLang;
 
 	def validateContentModel(self):
 		'''Validates task model XML and returns default namespace on success'''
 
-		try:
-			# load schema
-			schema_parser_ctx = libxml2.schemaNewParserCtxt(os.path.join(self.scriptPath, 'schemas', 'modelSchema.xsd'))
-			schema = schema_parser_ctx.schemaParse()
-			valid_schema = schema.schemaNewValidCtxt()
-		except libxml2.libxmlError, e:
-			raise InvalidSchemaException('Task model schema is invalid')
-
 		# validate
-		if self.xml.schemaValidateDoc(valid_schema):
+		errors = validateDocument(self.xml, os.path.join(schemaDir, 'modelSchema.xsd'), 'task model')
+		if errors:
 			# throw exception, because document is not valid
-			raise InvalidTaskModelException('Task model XML is invalid.')
+			raise InvalidTaskModelException('Task model XML is invalid.', {'task model': errors})
 
 		return 'http://www.alfresco.org/model/dictionary/1.0'
 
@@ -158,7 +320,7 @@ class ConfigGenerator:
 		# clone xml
 		self.result = copy.copy(self.xml)
 		# get new xpath context
-		ctx = self.result.xpathNewContext()
+		ctx = self.newXPathContext(self.result)
 		# register default namespace
 		ctx.xpathRegisterNs('defaultns', ns)
 
@@ -210,7 +372,7 @@ class ConfigGenerator:
 		if addMetaData:
 			if self.addComments:
 				root.addChild(self.result.newDocComment('Model metadata'))
-			root.addChild(self.result.newDocNode(None, 'description', 'Task model for '+self.xmlFile))
+			root.addChild(self.result.newDocNode(None, 'description', 'Task model for '+(self.xmlFile or 'process definition')))
 			root.addChild(self.result.newDocNode(None, 'author', os.getenv('USER')))
 			root.addChild(self.result.newDocNode(None, 'version', '1.0'))
 		# add import section
@@ -218,7 +380,7 @@ class ConfigGenerator:
 			root.addChild(self.result.newDocComment('Import necessary namespaces'))
 		root.addChild(libxml2.parseMemory(importTemplate, len(importTemplate)).getRootElement())
 		# build array containing information about tasks
-		ctx = self.xml.xpathNewContext()
+		ctx = self.newXPathContext(self.xml)
 		ns = defNS[lang]
 		# register default namespace
 		ctx.xpathRegisterNs('defaultns', ns)
@@ -375,6 +537,12 @@ class ConfigGenerator:
 
 
 
+	def createUIConfigDoc(self):
+		'''Creates new share config document with empty alfresco-config root element.'''
+		result = libxml2.newDoc('1.0')
+		result.setRootElement(result.newDocNode(None, 'alfresco-config', None))
+		return result
+
 	def generateUIConfig(self, workflowModel, processName='', addLabelId=False, addSets=False):
 		'''Generates skeleton of share-custom-config.xml for workflow/documentLibrary UI rendering.
 
@@ -391,183 +559,280 @@ class ConfigGenerator:
 		# validate xml
 		ns = self.validateContentModel()
 		# get new xpath context
-		ctx = self.xml.xpathNewContext()
+		ctx = self.newXPathContext(self.xml)
 		# register default namespace
 		ctx.xpathRegisterNs('defaultns', ns)
 		# build config for UI rendering
 		# create new document and root node
-		self.result = libxml2.newDoc('1.0')
-		root = self.result.newDocNode(None, 'alfresco-config', None)
-		self.result.setRootElement(root)
+		self.result = self.createUIConfigDoc()
 		# populate task type list
 		types = ctx.xpathEval('/defaultns:model/defaultns:types/defaultns:type')
 		# iterate throught all types and build config
 		for typeNode in types:
-			ctx.setContextNode(typeNode)
-			# create config node
-			configNode = self.result.newDocNode(None, 'config', None)
-			# choose evaluator based on model type
-			if workflowModel:
-				# if this is startTask then we should use another condition
-				if 'bpm:startTask' in [x.content for x in ctx.xpathEval('defaultns:parent')]:
-					configNode.setProp('evaluator', 'string-compare')
-					configNode.setProp('condition', processName)
-				else:
-					configNode.setProp('evaluator', 'task-type')
-					configNode.setProp('condition', typeNode.prop('name'))
+			self.buildTypeConfig(self.result, ctx, typeNode, workflowModel, processName, addLabelId, addSets)
+
+	def buildTypeConfig(self, result, ctx, typeNode, workflowModel, processName='', addLabelId=False, addSets=False):
+		'''Builds config elements for type and adds them to the root of share config document.
+
+		Keyword arguments:
+			result -- share config document to add config to
+			ctx -- xpath context of content model with registered default namespace
+			typeNode -- type element of content model
+			workflowModel -- treat model as workflow model
+			processName -- process name to use in generated config (default '')
+			addLabelId -- insert label-id attribute into each filed tag (default False)
+			addSets -- add sets definitions to each form (default False)
+
+		'''
+
+		root = result.getRootElement()
+		ctx.setContextNode(typeNode)
+		# create config node
+		configNode = result.newDocNode(None, 'config', None)
+		# choose evaluator based on model type
+		if workflowModel:
+			# if this is startTask then we should use another condition
+			if 'bpm:startTask' in [x.content for x in ctx.xpathEval('defaultns:parent')]:
+				configNode.setProp('evaluator', 'string-compare')
+				configNode.setProp('condition', processName)
 			else:
-				configNode.setProp('evaluator', 'node-type')
+				configNode.setProp('evaluator', 'task-type')
 				configNode.setProp('condition', typeNode.prop('name'))
+		else:
+			configNode.setProp('evaluator', 'node-type')
+			configNode.setProp('condition', typeNode.prop('name'))
+		if self.addComments:
+			root.addChild(result.newDocComment('Form config for ' + typeNode.prop('name') + ' rendering'))
+		root.addChild(configNode)
+		# create forms and form nodes
+		formsNode = result.newDocNode(None, 'forms', None)
+		formNode = result.newDocNode(None, 'form', None)
+		configNode.addChild(formsNode)
+		formsNode.addChild(formNode)
+		# create field-visibility and appearance nodes
+		fieldVisNode = result.newDocNode(None, 'field-visibility', None)
+		if self.addComments:
+			formNode.addChild(result.newDocComment('List of fields to render'))
+		formNode.addChild(fieldVisNode)
+		appearanceNode = result.newDocNode(None, 'appearance', None)
+		if self.addComments:
+			formNode.addChild(result.newDocComment('Fields appearance configuration'))
+		formNode.addChild(appearanceNode)
+		# add sets definitions
+		if addSets:
 			if self.addComments:
-				root.addChild(self.result.newDocComment('Form config for ' + typeNode.prop('name') + ' rendering'))
-			root.addChild(configNode)
-			# create forms and form nodes
-			formsNode = self.result.newDocNode(None, 'forms', None)
-			formNode = self.result.newDocNode(None, 'form', None)
-			configNode.addChild(formsNode)
-			formsNode.addChild(formNode)
-			# create field-visibility and appearance nodes
-			fieldVisNode = self.result.newDocNode(None, 'field-visibility', None)
-			if self.addComments:
-				formNode.addChild(self.result.newDocComment('List of fields to render'))
-			formNode.addChild(fieldVisNode)
-			appearanceNode = self.result.newDocNode(None, 'appearance', None)
-			if self.addComments:
-				formNode.addChild(self.result.newDocComment('Fields appearance configuration'))
-			formNode.addChild(appearanceNode)
-			# add sets definitions
-			if addSets:
-				if self.addComments:
-					appearanceNode.addChild(self.result.newDocComment('Sets definition'))
-				# top set
-				if workflowModel:
-					setNode = self.result.newDocNode(None, 'set', None)
-					setNode.setProp('id', 'info')
-					setNode.setProp('appearance', '')
-					if addLabelId:
-						setNode.setProp('label-id', 'workflow.set.task.info')
-					appearanceNode.addChild(setNode)
-				# other set
-				setNode = self.result.newDocNode(None, 'set', None)
-				setNode.setProp('id', 'other')
+				appearanceNode.addChild(result.newDocComment('Sets definition'))
+			# top set
+			if workflowModel:
+				setNode = result.newDocNode(None, 'set', None)
+				setNode.setProp('id', 'info')
+				setNode.setProp('appearance', '')
+				if addLabelId:
+					setNode.setProp('label-id', 'workflow.set.task.info')
+				appearanceNode.addChild(setNode)
+			# other set
+			setNode = result.newDocNode(None, 'set', None)
+			setNode.setProp('id', 'other')
+			setNode.setProp('appearance', 'title')
+			if addLabelId:
+				setNode.setProp('label-id', 'workflow.set.other')
+			appearanceNode.addChild(setNode)
+			# items set
+			if workflowModel:
+				setNode = result.newDocNode(None, 'set', None)
+				setNode.setProp('id', 'items')
 				setNode.setProp('appearance', 'title')
 				if addLabelId:
-					setNode.setProp('label-id', 'workflow.set.other')
+					setNode.setProp('label-id', 'workflow.set.items')
 				appearanceNode.addChild(setNode)
-				# items set
-				if workflowModel:
-					setNode = self.result.newDocNode(None, 'set', None)
-					setNode.setProp('id', 'items')
+			# response set
+			if workflowModel:
+				if 'bpm:startTask' not in [x.content for x in ctx.xpathEval('defaultns:parent')]:
+					setNode = result.newDocNode(None, 'set', None)
+					setNode.setProp('id', 'response')
 					setNode.setProp('appearance', 'title')
 					if addLabelId:
-						setNode.setProp('label-id', 'workflow.set.items')
+						setNode.setProp('label-id', 'workflow.set.response')
 					appearanceNode.addChild(setNode)
-				# response set
-				if workflowModel:
-					if 'bpm:startTask' not in [x.content for x in ctx.xpathEval('defaultns:parent')]:
-						setNode = self.result.newDocNode(None, 'set', None)
-						setNode.setProp('id', 'response')
-						setNode.setProp('appearance', 'title')
-						if addLabelId:
-							setNode.setProp('label-id', 'workflow.set.response')
-						appearanceNode.addChild(setNode)
-
-			# for each property ans association generate field elements
-			if self.addComments:
-				appearanceNode.addChild(self.result.newDocComment('Fields'))
-			properties = [x.prop('name') for x in ctx.xpathEval('defaultns:properties/defaultns:property') + ctx.xpathEval('defaultns:associations/defaultns:association')]
-			for property in properties:
-				# create show and field nodes
-				showNode = self.result.newDocNode(None, 'show', None)
-				showNode.setProp('id', property)
-				fieldVisNode.addChild(showNode)
-				fieldNode = self.result.newDocNode(None, 'field', None)
-				fieldNode.setProp('id', property)
-				if addLabelId:
-					# activity: don't add label-id if property name ends with Outcome
-					if not property.endswith('Outcome'):
-						fieldNode.setProp('label-id', 'label.' + property.replace(':', '_'))
-				if addSets:
-					# activiti : add to response set if property name ends with Outcome
-					if property.endswith('Outcome'):
-						fieldNode.setProp('set', 'response')
-					else:
-						fieldNode.setProp('set', 'other')
-				appearanceNode.addChild(fieldNode)
 
-			# populate all aspects for type
-			aspects = [x.content for x in ctx.xpathEval('defaultns:mandatory-aspects/defaultns:aspect')]
-			# for each aspect try to find its definition to extract all properties and associations
-			for aspect in aspects:
-				aspectDefNode = ctx.xpathEval('/defaultns:model/defaultns:aspects/defaultns:aspect[@name=\'' + aspect + '\']')
-				# if list is not empty then choose first element (because we expect at most one aspect definition)
-				if len(aspectDefNode):
-					aspectDefNode = aspectDefNode[0]
-					# find all properties and associations
-					ctx.setContextNode(aspectDefNode)
-					fields = [x.prop('name') for x in ctx.xpathEval('defaultns:properties/defaultns:property') + ctx.xpathEval('defaultns:associations/defaultns:association')]
-					# add them to tree
-					for field in fields:
-						# create show and field nodes
-						showNode = self.result.newDocNode(None, 'show', None)
-						showNode.setProp('id', field)
-						fieldVisNode.addChild(showNode)
-						fieldNode = self.result.newDocNode(None, 'field', None)
-						fieldNode.setProp('id', field)
-						if addLabelId:
-							fieldNode.setProp('label-id', 'label.' + field.replace(':', '_'))
-						if addSets:
-							fieldNode.setProp('set', 'other')
-						appearanceNode.addChild(fieldNode)
+		# for each property ans association generate field elements
+		if self.addComments:
+			appearanceNode.addChild(result.newDocComment('Fields'))
+		properties = [x.prop('name') for x in ctx.xpathEval('defaultns:properties/defaultns:property') + ctx.xpathEval('defaultns:associations/defaultns:association')]
+		for property in properties:
+			# create show and field nodes
+			showNode = result.newDocNode(None, 'show', None)
+			showNode.setProp('id', property)
+			fieldVisNode.addChild(showNode)
+			fieldNode = result.newDocNode(None, 'field', None)
+			fieldNode.setProp('id', property)
+			if addLabelId:
+				# activity: don't add label-id if property name ends with Outcome
+				if not property.endswith('Outcome'):
+					fieldNode.setProp('label-id', 'label.' + property.replace(':', '_'))
+			if addSets:
+				# activiti : add to response set if property name ends with Outcome
+				if property.endswith('Outcome'):
+					fieldNode.setProp('set', 'response')
 				else:
-					# aspect definition not found, add field with the same name as aspect
+					fieldNode.setProp('set', 'other')
+			appearanceNode.addChild(fieldNode)
+
+		# populate all aspects for type
+		aspects = [x.content for x in ctx.xpathEval('defaultns:mandatory-aspects/defaultns:aspect')]
+		# for each aspect try to find its definition to extract all properties and associations
+		for aspect in aspects:
+			aspectDefNode = ctx.xpathEval('/defaultns:model/defaultns:aspects/defaultns:aspect[@name=\'' + aspect + '\']')
+			# if list is not empty then choose first element (because we expect at most one aspect definition)
+			if len(aspectDefNode):
+				aspectDefNode = aspectDefNode[0]
+				# find all properties and associations
+				ctx.setContextNode(aspectDefNode)
+				fields = [x.prop('name') for x in ctx.xpathEval('defaultns:properties/defaultns:property') + ctx.xpathEval('defaultns:associations/defaultns:association')]
+				# add them to tree
+				for field in fields:
 					# create show and field nodes
-					showNode = self.result.newDocNode(None, 'show', None)
-					showNode.setProp('id', aspect)
+					showNode = result.newDocNode(None, 'show', None)
+					showNode.setProp('id', field)
 					fieldVisNode.addChild(showNode)
-					fieldNode = self.result.newDocNode(None, 'field', None)
-					fieldNode.setProp('id', aspect)
+					fieldNode = result.newDocNode(None, 'field', None)
+					fieldNode.setProp('id', field)
 					if addLabelId:
-						fieldNode.setProp('label-id', 'label.' + aspect.replace(':', '_'))
+						fieldNode.setProp('label-id', 'label.' + field.replace(':', '_'))
 					if addSets:
 						fieldNode.setProp('set', 'other')
 					appearanceNode.addChild(fieldNode)
-			# add items field
-			if workflowModel:
-				showNode = self.result.newDocNode(None, 'show', None)
-				showNode.setProp('id', 'packageItems')
+			else:
+				# aspect definition not found, add field with the same name as aspect
+				# create show and field nodes
+				showNode = result.newDocNode(None, 'show', None)
+				showNode.setProp('id', aspect)
 				fieldVisNode.addChild(showNode)
-				fieldNode = self.result.newDocNode(None, 'field', None)
-				fieldNode.setProp('id', 'packageItems')
+				fieldNode = result.newDocNode(None, 'field', None)
+				fieldNode.setProp('id', aspect)
+				if addLabelId:
+					fieldNode.setProp('label-id', 'label.' + aspect.replace(':', '_'))
 				if addSets:
-					fieldNode.setProp('set', 'items')
+					fieldNode.setProp('set', 'other')
 				appearanceNode.addChild(fieldNode)
-				# add transitions field
-				ctx.setContextNode(typeNode)
-				if 'bpm:startTask' not in [x.content for x in ctx.xpathEval('defaultns:parent')]:
-					showNode = self.result.newDocNode(None, 'show', None)
-					showNode.setProp('id', 'transitions')
-					fieldVisNode.addChild(showNode)
-					fieldNode = self.result.newDocNode(None, 'field', None)
-					fieldNode.setProp('id', 'transitions')
-					if addSets:
-						fieldNode.setProp('set', 'response')
-					appearanceNode.addChild(fieldNode)
+		# add items field
+		if workflowModel:
+			showNode = result.newDocNode(None, 'show', None)
+			showNode.setProp('id', 'packageItems')
+			fieldVisNode.addChild(showNode)
+			fieldNode = result.newDocNode(None, 'field', None)
+			fieldNode.setProp('id', 'packageItems')
+			if addSets:
+				fieldNode.setProp('set', 'items')
+			appearanceNode.addChild(fieldNode)
+			# add transitions field
+			ctx.setContextNode(typeNode)
+			if 'bpm:startTask' not in [x.content for x in ctx.xpathEval('defaultns:parent')]:
+				showNode = result.newDocNode(None, 'show', None)
+				showNode.setProp('id', 'transitions')
+				fieldVisNode.addChild(showNode)
+				fieldNode = result.newDocNode(None, 'field', None)
+				fieldNode.setProp('id', 'transitions')
+				if addSets:
+					fieldNode.setProp('set', 'response')
+				appearanceNode.addChild(fieldNode)
+			else:
+				# create form for workflow details rendering
+				configNode = configNode.copyNodeList()
+				# replace condition
+				configNode.setProp('evaluator', 'task-type')
+				configNode.setProp('condition', typeNode.prop('name'))
+				if self.addComments:
+					root.addChild(result.newDocComment('Form config to display workflow info'))
+				# remove info set
+				if addSets:
+					resctx = result.xpathNewContext()
+					resctx.setContextNode(configNode)
+					resctx.xpathEval('forms/form/appearance/set[@id=\'info\']')[0].unlinkNode()
+					resctx.xpathFreeContext()
+				# add to tree
+				root.addChild(configNode)
+
+	def writeUIConfig(self, stream, workflowModel, processName='', addLabelId=False, addSets=False, jobs=None, outputDir=None, removeBlanks=False, format=False):
+		'''Generates skeleton of share-custom-config.xml like generateUIConfig(), but builds config
+		of each type independently in a pool of worker processes. Configs are written either to
+		separate files or in order to single stream, so only few of them are kept in memory at once.
+		Forked workers share parsed content model of parent process, which is only read.
+
+		Keyword arguments:
+			stream -- file object to write config to (not used if outputDir is set)
+			workflowModel -- treat model as workflow model
+			processName -- process name to use in generated config (default '')
+			addLabelId -- insert label-id attribute into each filed tag (default False)
+			addSets -- add sets definitions to each form (default False)
+			jobs -- number of worker processes (default number of CPUs)
+			outputDir -- directory to write config of each type to separate file (default None)
+			removeBlanks -- remove all blank nodes from resulting XML (default False)
+			format -- format output with blanks (default False)
+
+		'''
+
+		import multiprocessing
+		# set result type, result contains names of written files
+		self.xmlResult = False
+		self.result = []
+		# validate xml
+		ns = self.validateContentModel()
+		options = {
+                    'ns': ns,
+                    'workflowModel': workflowModel,
+                    'processName': processName,
+                    'addLabelId': addLabelId,
+                    'addSets': addSets,
+                    'outputDir': outputDir,
+                    'removeBlanks': removeBlanks,
+                    'format': format
+                  }
+		# count types
+		ctx = self.xml.xpathNewContext()
+		ctx.xpathRegisterNs('defaultns', ns)
+		count = int(ctx.xpathEval('count(/defaultns:model/defaultns:types/defaultns:type)'))
+		ctx.xpathFreeContext()
+		if outputDir:
+			# check output directory before any config is built
+			if not os.path.isdir(outputDir):
+				os.makedirs(outputDir)
+			if not os.access(outputDir, os.W_OK):
+				raise IOError('directory ' + outputDir + ' is not writable')
+		if not jobs:
+			jobs = multiprocessing.cpu_count()
+		pool = None
+		try:
+			if jobs > 1:
+				# libxml2 bindings hold interpreter lock, so build configs in worker processes
+				if sys.platform == 'win32':
+					# workers aren't forked, pass them serialized content model to parse
+					initArgs = (None, options, self.xml.serialize('utf-8', 0), self.addComments)
 				else:
-					# create form for workflow details rendering
-					configNode = configNode.copyNodeList()
-					# replace condition
-					configNode.setProp('evaluator', 'task-type')
-					configNode.setProp('condition', typeNode.prop('name'))
-					if self.addComments:
-						root.addChild(self.result.newDocComment('Form config to display workflow info'))
-					# remove info set
-					if addSets:
-						resctx = self.result.xpathNewContext()
-						resctx.setContextNode(configNode)
-						resctx.xpathEval('forms/form/appearance/set[@id=\'info\']')[0].unlinkNode()
-					# add to tree
-					root.addChild(configNode)
+					# forked workers inherit parsed content model without pickling
+					initArgs = (self, options)
+				pool = multiprocessing.Pool(jobs, initUIConfigShardWorker, initArgs)
+				shards = pool.imap(buildUIConfigShard, range(count), max(1, count / (jobs * 4)))
+			else:
+				initUIConfigShard(self, options)
+				shards = (buildUIConfigShard(i) for i in range(count))
+			if outputDir:
+				# collect names of written files
+				self.result.extend(shards)
+			else:
+				# stitch configs into one document
+				stream.write('<?xml version="1.0" encoding="utf-8"?>\n<alfresco-config>')
+				for text in shards:
+					stream.write(text)
+				stream.write('\n</alfresco-config>\n' if format else '</alfresco-config>\n')
+		finally:
+			if pool:
+				pool.terminate()
+				pool.join()
+			elif shardState:
+				# don't keep this document after configs are built
+				shardState['ctx'].xpathFreeContext()
+				shardState.clear()
 
 	def generateWorkflowBundle(self):
 		'''Generates workflow internationalization bundle (tasks and transitions)'''
@@ -578,7 +843,7 @@ class ConfigGenerator:
 		lang = self.validateProcessDefinition()
 		ns = defNS[lang]
 		# get new xpath context
-		ctx = self.xml.xpathNewContext()
+		ctx = self.newXPathContext(self.xml)
 		# register default namespace
 		ctx.xpathRegisterNs('defaultns', ns)
 		if lang in ['jpdl-3.1', 'jpdl-3.2']:
@@ -605,7 +870,7 @@ class ConfigGenerator:
 		# set result type
 		self.xmlResult = False
 		# get new xpath context
-		ctx = self.xml.xpathNewContext()
+		ctx = self.newXPathContext(self.xml)
 		self.result = [x.prop('label-id') + '=' for x in ctx.xpathEval('/alfresco-config/config/forms/form/appearance/field[@label-id!=\'\']')]
 		# remove dplicates
 		self.result = list(set(self.result))
@@ -617,7 +882,7 @@ class ConfigGenerator:
 		# validate task model
 		ns = self.validateContentModel()
 		# get new xpath context
-		ctx = self.xml.xpathNewContext()
+		ctx = self.newXPathContext(self.xml)
 		ctx.xpathRegisterNs('defaultns', ns)
 		# get content model name
 		modelName = self.xml.getRootElement().prop('name').replace(':', '_')
@@ -645,9 +910,199 @@ class ConfigGenerator:
 		for x in self.result:
 			print(x)
 
-# run script
-if __name__ == '__main__':
-	# parse command line arguments
+# XML declaration starting next document in concatenated stream, or beginning of
+# comment or CDATA section, inside which declaration doesn't start new document
+xmlMarkRe = re.compile(r'<\?xml\s|<!--|<!\[CDATA\[')
+# ends of comment and CDATA section
+xmlMarkEnds = {'<!--': '-->', '<![CDATA[': ']]>'}
+
+def readDocuments(stream, nulDelimited=False, chunkSize=4096):
+	'''Reads stream of XML documents with libxml2 push parser and yields them one by one.
+
+	Documents are fed to parser in chunks as soon as they arrive, so each document
+	is yielded right after its end is seen, without waiting for the whole stream.
+	Documents should be separated by NUL characters if nulDelimited is set, otherwise
+	each of them should start with XML declaration. None is yielded for document
+	that is not well-formed.
+
+	Keyword arguments:
+		stream -- file object to read documents from
+		nulDelimited -- documents are separated by NUL characters (default False)
+		chunkSize -- maximum size of chunk read at once (default 4096)
+
+	'''
+
+	loadBackend()
+	# parser state for current document
+	state = {'ctxt': None}
+
+	def feed(data):
+		'''Passes chunk of current document to push parser.'''
+		if state['ctxt'] is None:
+			# skip blanks between documents
+			data = data.lstrip()
+			if not data:
+				return
+			state['ctxt'] = libxml2.createPushParser(None, None, 0, None)
+			state['ctxt'].ctxtUseOptions(parseOptions())
+		state['ctxt'].parseChunk(data, len(data), 0)
+
+	def finish():
+		'''Terminates current document and returns it (None if document is not well-formed).'''
+		ctxt = state['ctxt']
+		state['ctxt'] = None
+		ctxt.parseChunk('', 0, 1)
+		try:
+			doc = ctxt.doc()
+		except libxml2.parserError:
+			# parser failed before document was created
+			return None
+		if not ctxt.wellFormed():
+			doc.freeDoc()
+			doc = None
+		return doc
+
+	buf = ''
+	# position in buf up to which data is scanned for boundaries
+	pos = 0
+	# end of comment or CDATA section being scanned
+	term = None
+	eof = False
+	while not eof:
+		# read whatever is available instead of waiting for full chunk
+		chunk = os.read(stream.fileno(), chunkSize)
+		eof = not chunk
+		buf += chunk
+		if nulDelimited:
+			# every NUL ends current document
+			docs = buf.split('\0')
+			for data in docs[:-1]:
+				feed(data)
+				if state['ctxt'] is not None:
+					yield finish()
+			feed(docs[-1])
+			buf = ''
+			continue
+		while True:
+			if term:
+				# skip to the end of comment or CDATA section
+				end = buf.find(term, pos)
+				if end < 0:
+					# hold back tail which may be beginning of terminator
+					pos = max(pos, len(buf) - len(term) + 1)
+					break
+				pos = end + len(term)
+				term = None
+				continue
+			mark = xmlMarkRe.search(buf, pos)
+			if not mark:
+				# hold back tail which may be beginning of marker
+				pos = max(pos, len(buf) - len('<![CDATA[') + 1)
+				break
+			if mark.group() in xmlMarkEnds:
+				term = xmlMarkEnds[mark.group()]
+				pos = mark.end()
+			elif state['ctxt'] is None and not buf[:mark.start()].strip():
+				# declaration of current document
+				pos = mark.end()
+			else:
+				# declaration of next document, finish current one
+				feed(buf[:mark.start()])
+				yield finish()
+				buf = buf[mark.start():]
+				pos = 0
+		if eof:
+			pos = len(buf)
+		feed(buf[:pos])
+		buf = buf[pos:]
+		pos = 0
+	# last document in stream
+	if state['ctxt'] is not None:
+		yield finish()
+
+def processDocument(args, xml=None):
+	'''Performs action requested in command line arguments and prints result. Returns exit status.
+
+	Keyword arguments:
+		args -- parsed command line arguments
+		xml -- already parsed document to use instead of reading args.file (default None)
+
+	'''
+
+	# create ConfigGenerator and load XML
+	confgen = ConfigGenerator(args.file, args.comments, xml)
+	loadBackend()
+	try:
+		confgen.load()
+	except libxml2.libxmlError, e:
+		print('Cannot parse XML. Terminating.')
+		return 1
+	try:
+		if args.swimlanes:
+			# add swimlane tags
+			confgen.addSwimlanes()
+		elif args.model:
+			# generate task model
+			confgen.generateTaskModel(args.metadata, args.mandatory_aspects, args.item_actions, args.aspect)
+		elif args.workflow_ui:
+			# generate workflow UI config
+			if args.jobs is not None or args.output_dir:
+				confgen.writeUIConfig(sys.stdout, True, args.process_name, args.label_id, args.sets, args.jobs, args.output_dir, args.remove_blanks, args.format)
+			else:
+				confgen.generateUIConfig(True, args.process_name, args.label_id, args.sets)
+		elif args.model_ui:
+			# generate model UI config
+			if args.jobs is not None or args.output_dir:
+				confgen.writeUIConfig(sys.stdout, False, '', args.label_id, args.sets, args.jobs, args.output_dir, args.remove_blanks, args.format)
+			else:
+				confgen.generateUIConfig('', False, args.label_id, args.sets)
+		elif args.workflow_i18n:
+			# generate workflow internationalization bundle
+			confgen.generateWorkflowBundle()
+		elif args.share_i18n:
+			# generate share internationalization bundle
+			confgen.generateShareBundle()
+		elif args.model_i18n:
+			# generate model internationalization bundle
+			confgen.generateModelBundle()
+	except ValidationException, e:
+		print('XML validation failed: ' + e.message)
+		# print collected validation errors
+		for lang in sorted(e.diagnostics):
+			for error in e.diagnostics[lang]:
+				print('  ' + lang + ': ' + error)
+		return 1
+	except EnvironmentError, e:
+		print('Cannot write output: ' + str(e))
+		return 1
+	else:
+		# do diffrent stuff depending on result type
+		if confgen.xmlResult:
+			# remove blank nodes
+			if args.remove_blanks:
+				confgen.removeBlankNodes(confgen.result)
+			# output XML
+			sys.stdout.flush()
+			confgen.result.saveFormatFileEnc('-', 'utf-8', args.format)
+		else:
+			# print strings
+			confgen.printListResult()
+		return 0
+	finally:
+		# free documents, libxml2 wrappers don't do it on their own
+		confgen.free()
+
+def main(argv=None):
+	'''Command line entry point. Returns exit status.
+
+	Only argparse is imported before arguments are parsed, so --help and usage errors
+	don't pay for loading libxml2 (startup target: under 50 ms for --help).
+
+	Keyword arguments:
+		argv -- command line arguments (default sys.argv[1:])
+
+	'''
+	import argparse
 
 	# create argument parser
 	parser = argparse.ArgumentParser(description='Generates skeleton of some Alfresco configuration files using process definition XML, task model, share custom config.')
@@ -677,55 +1132,40 @@ if __name__ == '__main__':
 	workflowUIArgs.add_argument('-n', '--process-name', default='', action='store', help='workflow process name to be used in generated config (with prefix)')
 	workflowUIArgs.add_argument('-l', '--label-id', action='store_true', help='insert label-id attribute into each field tag')
 	workflowUIArgs.add_argument('-S', '--sets', action='store_true', help='add sets definitions and set correspoding field attribute')
+	workflowUIArgs.add_argument('-j', '--jobs', type=int, action='store', help='build config of each type independently using JOBS worker processes (0 means number of CPUs)')
+	workflowUIArgs.add_argument('-o', '--output-dir', action='store', help='write config of each type to separate file in OUTPUT_DIR')
 
 	# add arguments related to XML output
 	outputArgs = parser.add_argument_group('Output arguments')
 	outputArgs.add_argument('-f', '--format', action='store_true', help='format output with blanks (works only if -r specified)')
 	outputArgs.add_argument('-c', '--comments', action='store_true', help='add comments to resulting XML')
 	outputArgs.add_argument('-r', '--remove-blanks', action='store_true', help='remove all blank nodes from resulting XML')
+	outputArgs.add_argument('-0', '--null', action='store_true', help='documents read from stdin are separated by NUL characters, terminate each result with NUL character too')
 
 	# parse arguments
-	args = parser.parse_args()
+	args = parser.parse_args(argv)
+
+	# suppress all error messages from libxml2, including ones of schema parser which has no local handler
+	loadBackend().registerErrorHandler(lambda ctx, str: None, None)
+
+	if args.file == '-':
+		# stdin may carry several documents, process each of them as soon as it arrives
+		status = 0
+		for xml in readDocuments(sys.stdin, args.null):
+			if xml is None:
+				print('Cannot parse XML. Skipping.')
+				status = 1
+			else:
+				if processDocument(args, xml):
+					status = 1
+				xml.freeDoc()
+			# separate results
+			if args.null:
+				sys.stdout.write('\0')
+			sys.stdout.flush()
+		return status
+	return processDocument(args)
 
-	# create ConfigGenerator
-	try:
-		confgen = ConfigGenerator(args.file, args.comments)
-	except libxml2.libxmlError, e:
-		print('Cannot parse XML. Terminating.')
-		sys.exit(1);
-	try:
-		if args.swimlanes:
-			# add swimlane tags
-			confgen.addSwimlanes()
-		elif args.model:
-			# generate task model
-			confgen.generateTaskModel(args.metadata, args.mandatory_aspects, args.item_actions, args.aspect)
-		elif args.workflow_ui:
-			# generate workflow UI config
-			confgen.generateUIConfig(True, args.process_name, args.label_id, args.sets)
-		elif args.model_ui:
-			# generate model UI config
-			confgen.generateUIConfig('', False, args.label_id, args.sets)
-		elif args.workflow_i18n:
-			# generate workflow internationalization bundle
-			confgen.generateWorkflowBundle()
-		elif args.share_i18n:
-			# generate share internationalization bundle
-			confgen.generateShareBundle()
-		elif args.model_i18n:
-			# generate model internationalization bundle
-			confgen.generateModelBundle()
-	except ValidationException, e:
-		print('XML validation failed: ' + e.message)
-		sys.exit(1)
-
-	# do diffrent stuff depending on result type
-	if confgen.xmlResult:
-		# remove blank nodes
-		if args.remove_blanks:
-			confgen.removeBlankNodes(confgen.result)
-		# output XML
-		confgen.result.saveFormatFileEnc('-', 'utf-8', args.format)
-	else:
-		# print strings
-		confgen.printListResult()
+# run script
+if __name__ == '__main__':
+	sys.exit(main())